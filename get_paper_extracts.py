@@ -6,68 +6,99 @@ This uses JWT authentication to retrieve claims and evidence for given paper IDs
 Based on: api/docs/temporary/extract_fetching_analysis.md
 
 Requirements:
-    pip install httpx python-dotenv
+    pip install "httpx[http2]" python-dotenv
 """
 
 import httpx
 import sys
 import os
 import json
+import asyncio
+from collections import defaultdict
 from dotenv import load_dotenv
 
+from oshima_auth import apost_with_retry, get_cached_jwt, make_async_http_client, make_http_client
 
-def get_jwt_token(supabase_url: str, supabase_anon_key: str, email: str, password: str) -> str:
-    """
-    Sign in to Supabase and get a JWT token.
-
-    Args:
-        supabase_url: Supabase project URL
-        supabase_anon_key: Supabase anon/public key
-        email: User email
-        password: User password
+try:
+    import orjson
+except ImportError:  # optional: fall back to the stdlib json module
+    orjson = None
 
-    Returns:
-        JWT access token
-    """
-    url = f"{supabase_url}/auth/v1/token?grant_type=password"
 
-    headers = {
-        "apikey": supabase_anon_key,
-        "Content-Type": "application/json"
-    }
+EXTRACTS_BATCH_SIZE = 50  # max paper IDs per extracts request (override with OSHIMA_EXTRACTS_BATCH_SIZE)
+SAMPLE_SIZE = 3  # claims/evidence shown per paper
+SAMPLE_WIDTH = 100  # max characters of each sample's text
 
-    data = {
-        "email": email,
-        "password": password
-    }
 
-    print(f"🔑 Authenticating as {email}...")
+def _json_loads(data: bytes):
+    """Parse JSON bytes, using orjson when available."""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
 
-    response = httpx.post(url, json=data, headers=headers, timeout=30.0)
 
-    if response.status_code != 200:
-        print(f"❌ Authentication failed: {response.status_code}")
-        print(f"Response: {response.text}")
-        response.raise_for_status()
+def _json_dump(obj, path: str):
+    """Write obj to path as indented JSON, using orjson when available."""
+    if orjson:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, 'w') as f:
+            json.dump(obj, f, indent=2)
 
-    result = response.json()
-    access_token = result.get("access_token")
 
-    if not access_token:
-        raise ValueError("No access token in response")
+def chunked(items: list, size: int) -> list:
+    """Split a list into consecutive chunks of at most `size` items."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
 
-    print(f"✅ Authenticated successfully\n")
-    return access_token
 
+def _merge_extracts(results: list) -> dict:
+    """
+    Merge the responses of several batched extracts requests into one.
 
-def get_paper_extracts(api_url: str, jwt_token: str, paper_ids: list) -> dict:
+    Lists under `data` (papers, elements) are concatenated in batch order and
+    numeric `stats` are summed.
+    """
+    merged = {"status": "success", "data": {"papers": [], "elements": [], "stats": {}}}
+    data = merged["data"]
+
+    for result in results:
+        if result.get("status") and result["status"] != "success":
+            merged["status"] = result["status"]
+        for key, value in result.get("data", {}).items():
+            if key == "stats":
+                for stat, count in value.items():
+                    if isinstance(count, (int, float)):
+                        data["stats"][stat] = data["stats"].get(stat, 0) + count
+                    else:
+                        data["stats"].setdefault(stat, count)
+            elif isinstance(value, list):
+                data.setdefault(key, []).extend(value)
+            else:
+                data.setdefault(key, value)
+
+    return merged
+
+
+async def get_paper_extracts(
+    client: httpx.AsyncClient,
+    api_url: str,
+    jwt_token: str,
+    paper_ids: list,
+    batch_size: int = EXTRACTS_BATCH_SIZE
+) -> dict:
     """
     Fetch extracts for given paper IDs.
 
+    The API caps how many IDs one request may carry, so the IDs are split into
+    batches of `batch_size` that are fetched concurrently and merged.
+
     Args:
+        client: Shared async HTTP client
         api_url: Oshima API URL
         jwt_token: JWT access token
         paper_ids: List of paper UUIDs
+        batch_size: Maximum number of paper IDs per request
 
     Returns:
         Response dict with papers and their extracts
@@ -79,68 +110,84 @@ def get_paper_extracts(api_url: str, jwt_token: str, paper_ids: list) -> dict:
         "Content-Type": "application/json"
     }
 
-    data = {
-        "paper_ids": paper_ids
-    }
+    batches = chunked(paper_ids, batch_size)
 
-    print(f"📥 Fetching extracts for {len(paper_ids)} paper(s)...")
+    print(f"📥 Fetching extracts for {len(paper_ids)} paper(s) in {len(batches)} request(s)...")
     print(f"   API: {url}")
     for i, paper_id in enumerate(paper_ids, 1):
         print(f"   {i}. {paper_id}")
 
-    response = httpx.post(
-        url,
-        json=data,
-        headers=headers,
-        timeout=60.0
-    )
+    responses = await asyncio.gather(*(
+        apost_with_retry(
+            client,
+            url,
+            json={"paper_ids": batch},
+            headers=headers,
+            timeout=60.0
+        )
+        for batch in batches
+    ))
+
+    for response in responses:
+        if response.status_code != 200:
+            print(f"\n❌ Request failed: {response.status_code}")
+            print(f"Response: {response.text}")
+            response.raise_for_status()
 
-    if response.status_code != 200:
-        print(f"\n❌ Request failed: {response.status_code}")
-        print(f"Response: {response.text}")
-        response.raise_for_status()
+    return _merge_extracts([_json_loads(response.content) for response in responses])
 
-    result = response.json()
-    return result
+
+async def fetch_extracts(api_url: str, jwt_token: str, paper_ids: list, batch_size: int = EXTRACTS_BATCH_SIZE) -> dict:
+    """Fetch extracts over a dedicated pooled async client."""
+    async with make_async_http_client() as client:
+        return await get_paper_extracts(client, api_url, jwt_token, paper_ids, batch_size)
+
+
+def _sample_text(element: dict) -> str:
+    """Display text for a claim/evidence element, shortened to SAMPLE_WIDTH."""
+    text = element.get('text_rephrased') or element.get('text_verbatim') or ''
+    return text[:SAMPLE_WIDTH] + "..." if len(text) > SAMPLE_WIDTH else text
 
 
 def print_paper_summary(paper_data: dict, elements_for_paper: list):
     """Print a summary of paper extracts."""
-    metadata = paper_data.get('metadata', {})
+    metadata = paper_data.get('metadata') or {}
     title = metadata.get('title', 'Untitled')
 
     print(f"\n📄 Paper: {title}")
     print(f"   ID: {paper_data['id']}")
     print(f"   Filename: {metadata.get('original_filename', 'N/A')}")
 
-    # Count elements
-    claims = [e for e in elements_for_paper if e['type'] == 'claim']
-    evidence = [e for e in elements_for_paper if e['type'] == 'evidence']
+    # Count elements and keep the first few of each type in one pass
+    counts = {'claim': 0, 'evidence': 0}
+    samples = {'claim': [], 'evidence': []}
+    for element in elements_for_paper:
+        element_type = element['type']
+        if element_type in counts:
+            counts[element_type] += 1
+            if len(samples[element_type]) < SAMPLE_SIZE:
+                samples[element_type].append(element)
 
     bboxes = paper_data.get('bboxes', [])
 
-    print(f"   Claims: {len(claims)}")
-    print(f"   Evidence: {len(evidence)}")
+    print(f"   Claims: {counts['claim']}")
+    print(f"   Evidence: {counts['evidence']}")
     print(f"   Bounding Boxes: {len(bboxes)}")
 
     # Show sample claims
-    if claims:
+    if samples['claim']:
         print(f"\n   📝 Sample Claims:")
-        for claim in claims[:3]:
-            text = claim.get('text_rephrased', claim.get('text_verbatim', ''))
-            text = text[:100] + "..." if len(text) > 100 else text
-            print(f"      - {text}")
+        for claim in samples['claim']:
+            print(f"      - {_sample_text(claim)}")
     else:
         print(f"\n   ⚠️  No claims found - paper may still be processing")
 
     # Show sample evidence
-    if evidence:
+    if samples['evidence']:
         print(f"\n   🔍 Sample Evidence:")
-        for ev in evidence[:3]:
-            text = ev.get('text_rephrased', ev.get('text_verbatim', ''))
-            text = text[:100] + "..." if len(text) > 100 else text
-            points_to = ev.get('evidence_data', {}).get('points_to', [])
-            print(f"      - {text}")
+        for ev in samples['evidence']:
+            points_to = (ev.get('evidence_data') or {}).get('points_to', [])
+            print(f"      - {_sample_text(ev)}")
             if points_to:
                 print(f"        → Points to {len(points_to)} claim(s)")
     else:
@@ -178,6 +225,13 @@ def main():
         print("\nSet these in your .env file")
         sys.exit(1)
 
+    # Validate optional config
+    batch_size = os.getenv("OSHIMA_EXTRACTS_BATCH_SIZE", str(EXTRACTS_BATCH_SIZE)).strip()
+    if not batch_size.isdigit() or int(batch_size) < 1:
+        print(f"❌ OSHIMA_EXTRACTS_BATCH_SIZE must be a positive integer, got: {batch_size!r}")
+        sys.exit(1)
+    batch_size = int(batch_size)
+
     # Get paper IDs from command line
     if len(sys.argv) < 2:
         print("Usage: python get_paper_extracts.py <paper-id-1> [paper-id-2] ...")
@@ -196,15 +250,16 @@ def main():
 
     try:
         # Step 1: Authenticate and get JWT
-        jwt_token = get_jwt_token(supabase_url, supabase_anon_key, email, password)
+        with make_http_client() as client:
+            jwt_token = get_cached_jwt(client, supabase_url, supabase_anon_key, email, password)
+        print()
 
         # Step 2: Fetch extracts
-        result = get_paper_extracts(api_url, jwt_token, paper_ids)
+        result = asyncio.run(fetch_extracts(api_url, jwt_token, paper_ids, batch_size))
 
         # Save full response to file first (for debugging)
         output_file = "paper_extracts.json"
-        with open(output_file, 'w') as f:
-            json.dump(result, f, indent=2)
+        _json_dump(result, output_file)
         print(f"\n💾 Full response saved to: {output_file}")
 
         # Step 3: Display results
@@ -227,12 +282,9 @@ def main():
             print(f"   Total Evidence: {stats.get('total_evidence', 0)}\n")
 
             # Group elements by paper_id
-            elements_by_paper = {}
+            elements_by_paper = defaultdict(list)
             for element in all_elements:
-                paper_id = element.get('paper_id')
-                if paper_id not in elements_by_paper:
-                    elements_by_paper[paper_id] = []
-                elements_by_paper[paper_id].append(element)
+                elements_by_paper[element.get('paper_id')].append(element)
 
             # Print summary for each paper
             for paper in papers:
@@ -0,0 +1,369 @@
+"""
+Shared authentication and HTTP helpers for the Oshima API scripts.
+
+Signs in to Supabase (with an on-disk session cache), builds pooled HTTP
+clients, and retries transient POST failures with backoff.
+
+Requirements:
+    pip install "httpx[http2]"
+"""
+
+import httpx
+import os
+import base64
+import time
+import random
+import json
+import asyncio
+import hashlib
+import uuid
+from pathlib import Path
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:  # optional: the cache is then stored as plain JSON (mode 0600)
+    Fernet = None
+
+
+JWT_CACHE_FILE = Path.home() / ".oshima" / "jwt.json"
+JWT_EXPIRY_MARGIN = 60  # seconds of validity a cached token must have left
+MACHINE_ID_FILES = ("/etc/machine-id", "/var/lib/dbus/machine-id")
+RETRY_STATUSES = (429, 502, 503, 504)
+RETRY_ERRORS = (httpx.TransportError,)
+# Non-idempotent uploads only retry failures that happen before the server
+# could have accepted the paper; read timeouts and 502/504 are left to the
+# upload manifest and a resumed run.
+UPLOAD_RETRY_STATUSES = (429, 503)
+UPLOAD_RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def _retry_delay(attempt: int, response: httpx.Response = None, base: float = 0.5, cap: float = 30.0, jitter: float = 0.5) -> float:
+    """Seconds to wait before retry `attempt`, honoring a Retry-After header."""
+    if response is not None and "Retry-After" in response.headers:
+        try:
+            return float(response.headers["Retry-After"])
+        except ValueError:
+            pass
+    return min(cap, base * 2 ** attempt) + random.uniform(0, jitter)
+
+
+def post_with_retry(
+    client: httpx.Client,
+    url: str,
+    *,
+    retry_on: tuple = RETRY_STATUSES,
+    retry_errors: tuple = RETRY_ERRORS,
+    max_attempts: int = 5,
+    **kwargs
+) -> httpx.Response:
+    """
+    POST with exponential backoff and jitter on transient failures.
+
+    Retries when the status code is in `retry_on` or the request raises one
+    of `retry_errors`; any other transport error is raised immediately.
+    After `max_attempts` the last response is returned (or the last
+    transport error raised) for the caller to handle.
+    """
+    for attempt in range(max_attempts):
+        try:
+            response = client.post(url, **kwargs)
+        except retry_errors as e:
+            if attempt == max_attempts - 1:
+                raise
+            response, reason = None, type(e).__name__
+        else:
+            if response.status_code not in retry_on or attempt == max_attempts - 1:
+                return response
+            reason = response.status_code
+
+        delay = _retry_delay(attempt, response)
+        print(f"   ⏳ {reason} from {url}, retrying in {delay:.1f}s...")
+        time.sleep(delay)
+
+
+async def apost_with_retry(
+    client: httpx.AsyncClient,
+    url: str,
+    *,
+    retry_on: tuple = RETRY_STATUSES,
+    retry_errors: tuple = RETRY_ERRORS,
+    max_attempts: int = 5,
+    **kwargs
+) -> httpx.Response:
+    """Async counterpart of post_with_retry."""
+    for attempt in range(max_attempts):
+        try:
+            response = await client.post(url, **kwargs)
+        except retry_errors as e:
+            if attempt == max_attempts - 1:
+                raise
+            response, reason = None, type(e).__name__
+        else:
+            if response.status_code not in retry_on or attempt == max_attempts - 1:
+                return response
+            reason = response.status_code
+
+        delay = _retry_delay(attempt, response)
+        print(f"   ⏳ {reason} from {url}, retrying in {delay:.1f}s...")
+        await asyncio.sleep(delay)
+
+
+def _token_request(
+    client: httpx.Client,
+    supabase_url: str,
+    supabase_anon_key: str,
+    grant_type: str,
+    data: dict,
+    quiet: bool = False
+) -> dict:
+    """
+    POST to the Supabase token endpoint.
+
+    Args:
+        client: Shared HTTP client
+        supabase_url: Supabase project URL
+        supabase_anon_key: Supabase anon/public key
+        grant_type: "password" or "refresh_token"
+        data: Grant payload
+        quiet: Don't print the error response; the caller reports it
+
+    Returns:
+        Session dict with access_token and refresh_token
+    """
+    url = f"{supabase_url}/auth/v1/token?grant_type={grant_type}"
+
+    headers = {
+        "apikey": supabase_anon_key,
+        "Content-Type": "application/json"
+    }
+
+    response = post_with_retry(client, url, json=data, headers=headers, timeout=30.0)
+
+    if response.status_code != 200:
+        if not quiet:
+            print(f"❌ Authentication failed: {response.status_code}")
+            print(f"Response: {response.text}")
+        response.raise_for_status()
+
+    result = response.json()
+
+    if not result.get("access_token"):
+        raise ValueError("No access token in response")
+
+    return result
+
+
+def _sign_in(client: httpx.Client, supabase_url: str, supabase_anon_key: str, email: str, password: str) -> dict:
+    """Sign in with email/password and return the full Supabase session."""
+    data = {
+        "email": email,
+        "password": password
+    }
+
+    print(f"🔑 Authenticating as {email}...")
+
+    result = _token_request(client, supabase_url, supabase_anon_key, "password", data)
+
+    print(f"✅ Authenticated successfully")
+    return result
+
+
+def get_jwt_token(client: httpx.Client, supabase_url: str, supabase_anon_key: str, email: str, password: str) -> str:
+    """
+    Sign in to Supabase and get a JWT token.
+
+    Args:
+        client: Shared HTTP client
+        supabase_url: Supabase project URL
+        supabase_anon_key: Supabase anon/public key
+        email: User email
+        password: User password
+
+    Returns:
+        JWT access token
+    """
+    return _sign_in(client, supabase_url, supabase_anon_key, email, password)["access_token"]
+
+
+def _jwt_expiry(token: str) -> int:
+    """Read the `exp` claim from a JWT without verifying it."""
+    payload = token.split('.')[1]
+    return int(json.loads(base64.urlsafe_b64decode(payload + '=='))['exp'])
+
+
+def _is_invalid_grant(response: httpx.Response) -> bool:
+    """Whether Supabase rejected a refresh token as revoked, reused or unknown."""
+    if response.status_code not in (400, 401):
+        return False
+    try:
+        body = response.json()
+    except ValueError:
+        return False
+    error_code = str(body.get("error_code") or "")
+    return body.get("error") == "invalid_grant" or error_code.startswith(("refresh_token_", "session_"))
+
+
+def _cache_cipher():
+    """
+    Fernet cipher for the session cache, keyed on this machine's ID.
+
+    This keeps the cached tokens unusable if the file is copied to another
+    machine; it is not a defence against other code running as the same user.
+    Returns None when `cryptography` is not installed.
+    """
+    if Fernet is None:
+        return None
+
+    machine_id = None
+    for path in MACHINE_ID_FILES:
+        try:
+            with open(path, 'rb') as f:
+                machine_id = f.read().strip()
+            break
+        except OSError:
+            continue
+    if not machine_id:
+        machine_id = str(uuid.getnode()).encode()
+
+    key = hashlib.sha256(b"oshima-jwt-cache:" + machine_id).digest()
+    return Fernet(base64.urlsafe_b64encode(key))
+
+
+def _load_jwt_cache(supabase_url: str, email: str) -> dict:
+    """Return the cached session for this project/user, or None."""
+    try:
+        with open(JWT_CACHE_FILE, 'rb') as f:
+            raw = f.read()
+    except OSError:
+        return None
+
+    cipher = _cache_cipher()
+    if cipher:
+        try:
+            raw = cipher.decrypt(raw)
+        except InvalidToken:
+            pass  # plain JSON written before cryptography was installed
+
+    try:
+        cached = json.loads(raw)
+    except ValueError:
+        return None
+
+    if cached.get("supabase_url") != supabase_url or cached.get("email") != email:
+        return None
+    return cached
+
+
+def _save_jwt_cache(supabase_url: str, email: str, session: dict):
+    """
+    Atomically write the session to the cache file (mode 0600).
+
+    Access and refresh token are replaced together, so a rotated refresh
+    token is never stored next to a stale access token. The file is
+    encrypted when `cryptography` is installed.
+    """
+    access_token = session["access_token"]
+    cached = {
+        "supabase_url": supabase_url,
+        "email": email,
+        "access_token": access_token,
+        "refresh_token": session.get("refresh_token"),
+        "exp": _jwt_expiry(access_token)
+    }
+
+    raw = json.dumps(cached).encode()
+    cipher = _cache_cipher()
+    if cipher:
+        raw = cipher.encrypt(raw)
+
+    JWT_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = JWT_CACHE_FILE.with_suffix(".tmp")
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(raw)
+    os.replace(tmp_path, JWT_CACHE_FILE)
+
+
+def get_cached_jwt(
+    client: httpx.Client,
+    supabase_url: str,
+    supabase_anon_key: str,
+    email: str,
+    password: str,
+    min_validity: float = JWT_EXPIRY_MARGIN
+) -> str:
+    """
+    Get a JWT token, reusing the session cached in ~/.oshima/jwt.json when possible.
+
+    A cached access token is reused while it has more than `min_validity`
+    seconds left. Otherwise the stored refresh token is exchanged for a new
+    session and both tokens are rotated in the cache. A password sign-in is
+    only done when there is no cached session or Supabase rejects the
+    refresh token (invalid_grant); other refresh errors are raised.
+
+    Args:
+        client: Shared HTTP client
+        supabase_url: Supabase project URL
+        supabase_anon_key: Supabase anon/public key
+        email: User email
+        password: User password
+        min_validity: Seconds the returned token must stay valid for; long
+            runs should ask for more than the default JWT_EXPIRY_MARGIN
+
+    Returns:
+        JWT access token
+    """
+    cached = _load_jwt_cache(supabase_url, email)
+
+    if cached and cached.get("access_token") and cached.get("exp", 0) - time.time() > min_validity:
+        print(f"🔑 Using cached token for {email}")
+        return cached["access_token"]
+
+    session = None
+    if cached and cached.get("refresh_token"):
+        print(f"🔑 Refreshing session for {email}...")
+        try:
+            session = _token_request(
+                client, supabase_url, supabase_anon_key,
+                "refresh_token", {"refresh_token": cached["refresh_token"]},
+                quiet=True
+            )
+            print(f"✅ Session refreshed")
+        except httpx.HTTPStatusError as e:
+            if not _is_invalid_grant(e.response):
+                print(f"❌ Session refresh failed: {e.response.status_code}")
+                print(f"Response: {e.response.text}")
+                raise
+            print("⚠️  Refresh token rejected, signing in again")
+
+    if session is None:
+        session = _sign_in(client, supabase_url, supabase_anon_key, email, password)
+
+    try:
+        _save_jwt_cache(supabase_url, email, session)
+    except (OSError, ValueError, KeyError, IndexError) as e:
+        print(f"⚠️  Could not cache token: {e}")
+
+    return session["access_token"]
+
+
+def make_http_client() -> httpx.Client:
+    """Build the pooled HTTP/2 client shared by all requests in a run."""
+    return httpx.Client(http2=True, limits=httpx.Limits(max_keepalive_connections=20))
+
+
+def make_async_http_client(max_connections: int = 100) -> httpx.AsyncClient:
+    """
+    Build a pooled HTTP/2 async client.
+
+    Args:
+        max_connections: Upper bound on concurrent connections
+
+    Returns:
+        httpx.AsyncClient to be used as an async context manager
+    """
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=min(max_connections, 20)
+    )
+    return httpx.AsyncClient(http2=True, limits=limits)
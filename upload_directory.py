@@ -6,62 +6,91 @@ This uses JWT authentication (no service role key needed).
 Based on: api/docs/temporary/frontend_endpoints_authentication_overview.md
 
 Requirements:
-    pip install httpx python-dotenv
+    pip install "httpx[http2]" python-dotenv
 """
 
 import httpx
 import sys
 import os
+import asyncio
+import argparse
+import contextlib
+import secrets
+import hashlib
+import fnmatch
+import math
+import json
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
 from dotenv import load_dotenv
-import time
 
+from oshima_auth import (
+    UPLOAD_RETRY_ERRORS,
+    UPLOAD_RETRY_STATUSES,
+    apost_with_retry,
+    get_cached_jwt,
+    make_async_http_client,
+    make_http_client
+)
 
-def get_jwt_token(supabase_url: str, supabase_anon_key: str, email: str, password: str) -> str:
-    """
-    Sign in to Supabase and get a JWT token.
-
-    Args:
-        supabase_url: Supabase project URL
-        supabase_anon_key: Supabase anon/public key
-        email: User email
-        password: User password
-
-    Returns:
-        JWT access token
-    """
-    url = f"{supabase_url}/auth/v1/token?grant_type=password"
-
-    headers = {
-        "apikey": supabase_anon_key,
-        "Content-Type": "application/json"
-    }
-
-    data = {
-        "email": email,
-        "password": password
-    }
-
-    print(f"🔑 Authenticating as {email}...")
+try:
+    from aiolimiter import AsyncLimiter
+except ImportError:  # optional: fall back to _IntervalLimiter
+    AsyncLimiter = None
 
-    response = httpx.post(url, json=data, headers=headers, timeout=30.0)
 
-    if response.status_code != 200:
-        print(f"❌ Authentication failed: {response.status_code}")
-        print(f"Response: {response.text}")
-        response.raise_for_status()
+UPLOAD_CHUNK_SIZE = 64 * 1024  # bytes read per step when streaming a PDF
+HASH_CHUNK_SIZE = 1024 * 1024  # bytes read per step when hashing a PDF
+UPLOAD_TOKEN_MIN_VALIDITY = 50 * 60  # seconds a reused token must have left before a directory upload
+MANIFEST_NAME = ".oshima_uploaded.jsonl"  # per-directory record of finished uploads
 
-    result = response.json()
-    access_token = result.get("access_token")
 
-    if not access_token:
-        raise ValueError("No access token in response")
-
-    print(f"✅ Authenticated successfully")
-    return access_token
+class _MultipartUpload:
+    """
+    Streaming multipart/form-data body for one PDF plus its form fields.
 
+    The PDF is read in UPLOAD_CHUNK_SIZE chunks on a worker thread, so each
+    in-flight upload holds one chunk in memory and never blocks the event
+    loop. Every iteration re-reads the file from the start, which lets
+    retries replay the body.
+    """
 
-def upload_paper_with_jwt(
+    def __init__(self, pdf_file: Path, fields: dict):
+        self.boundary = secrets.token_hex(16)
+        self._pdf_file = pdf_file
+
+        filename = pdf_file.name.replace('\\', '\\\\').replace('"', '%22')
+        head = [
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            for name, value in fields.items()
+        ]
+        head.append(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            'Content-Type: application/pdf\r\n\r\n'
+        )
+        self._head = ''.join(head).encode()
+        self._tail = f'\r\n--{self.boundary}--\r\n'.encode()
+
+    @property
+    def headers(self) -> dict:
+        """Content-Type and Content-Length headers for this body."""
+        length = len(self._head) + self._pdf_file.stat().st_size + len(self._tail)
+        return {
+            "Content-Type": f"multipart/form-data; boundary={self.boundary}",
+            "Content-Length": str(length)
+        }
+
+    async def __aiter__(self):
+        yield self._head
+        with open(self._pdf_file, 'rb') as f:
+            while chunk := await asyncio.to_thread(f.read, UPLOAD_CHUNK_SIZE):
+                yield chunk
+        yield self._tail
+
+
+async def upload_paper_with_jwt(
+    client: httpx.AsyncClient,
     api_url: str,
     jwt_token: str,
     pdf_path: str,
@@ -74,6 +103,7 @@ def upload_paper_with_jwt(
     Upload a paper PDF using the POST /papers/ endpoint with JWT auth.
 
     Args:
+        client: Shared async HTTP client
         api_url: Oshima API URL
         jwt_token: JWT access token from Supabase auth
         pdf_path: Path to PDF file
@@ -95,39 +125,39 @@ def upload_paper_with_jwt(
     url = f"{api_url}/api/v1/papers/"
 
     try:
-        with open(pdf_file, 'rb') as f:
-            # Build multipart form data
-            files = {
-                'file': (pdf_file.name, f, 'application/pdf')
-            }
-
-            data = {}
-            if title:
-                data['title'] = title
-            if doi:
-                data['doi'] = doi
-            if field:
-                data['field'] = field
-            if topic:
-                data['topic'] = topic
-
-            headers = {
-                "Authorization": f"Bearer {jwt_token}"
-            }
-
-            response = httpx.post(
-                url,
-                files=files,
-                data=data,
-                headers=headers,
-                timeout=120.0  # 2 min timeout for large files
-            )
+        data = {}
+        if title:
+            data['title'] = title
+        if doi:
+            data['doi'] = doi
+        if field:
+            data['field'] = field
+        if topic:
+            data['topic'] = topic
+
+        # Stream the multipart body instead of handing httpx the file
+        body = _MultipartUpload(pdf_file, data)
+
+        headers = {
+            "Authorization": f"Bearer {jwt_token}",
+            **body.headers
+        }
+
+        response = await apost_with_retry(
+            client,
+            url,
+            retry_on=UPLOAD_RETRY_STATUSES,
+            retry_errors=UPLOAD_RETRY_ERRORS,
+            content=body,
+            headers=headers,
+            timeout=120.0  # 2 min timeout for large files
+        )
 
-            # Check for errors
-            if response.status_code not in [200, 201]:
-                print(f"   ❌ Upload failed: {response.status_code}")
-                print(f"   Response: {response.text}")
-                return None
+        # Check for errors
+        if response.status_code not in [200, 201]:
+            print(f"   ❌ Upload failed: {response.status_code}")
+            print(f"   Response: {response.text}")
+            return None
 
         result = response.json()
         return result
@@ -137,26 +167,140 @@ def upload_paper_with_jwt(
         return None
 
 
-def upload_directory(
+def sha1_file(path: str) -> str:
+    """SHA-1 hex digest of a file, read in HASH_CHUNK_SIZE chunks."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _hash_pool() -> Executor:
+    """Process pool for hashing PDFs on all cores (threads where processes are unavailable)."""
+    try:
+        return ProcessPoolExecutor()
+    except (OSError, NotImplementedError):
+        return ThreadPoolExecutor()
+
+
+def load_manifest(manifest_path: Path, api_url: str, user: str = None) -> dict:
+    """
+    Read the upload manifest of a directory.
+
+    Only uploads made to the same API as the same user count: the same
+    directory uploaded to another server or account is not skipped.
+
+    Args:
+        manifest_path: Path to the .oshima_uploaded.jsonl file
+        api_url: Oshima API URL the uploads are going to
+        user: Account the uploads are made as (e.g. OSHIMA_EMAIL)
+
+    Returns:
+        Dict mapping sha1 to the recorded upload (filename, sha1, paper_id, api_url, user, ts)
+    """
+    uploaded = {}
+    try:
+        with open(manifest_path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # e.g. a line cut short by an interrupted run
+                if (
+                    entry.get("sha1")
+                    and entry.get("api_url") == api_url.rstrip("/")
+                    and entry.get("user") == user
+                ):
+                    uploaded[entry["sha1"]] = entry
+    except FileNotFoundError:
+        pass
+    return uploaded
+
+
+def _record_upload(manifest_path: Path, entry: dict):
+    """Append one successful upload to the manifest."""
+    try:
+        with open(manifest_path, 'a') as f:
+            f.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        print(f"   ⚠️  Could not update {manifest_path.name}: {e}")
+
+
+class _IntervalLimiter:
+    """
+    Minimal stand-in for aiolimiter.AsyncLimiter when it isn't installed.
+
+    Spaces acquisitions evenly, time_period / max_rate seconds apart,
+    without allowing bursts.
+    """
+
+    def __init__(self, max_rate: float, time_period: float = 1.0):
+        self._interval = time_period / max_rate
+        self._next_slot = 0.0
+
+    async def __aenter__(self):
+        now = asyncio.get_running_loop().time()
+        wait = self._next_slot - now
+        self._next_slot = max(now, self._next_slot) + self._interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+def make_rate_limiter(rps: float):
+    """
+    Build a token-bucket limiter allowing `rps` requests per second.
+
+    Uses aiolimiter when available. Rates below 1/s are expressed as one
+    request per 1/rps seconds, since a bucket can't hold less than one token.
+    """
+    limiter_cls = AsyncLimiter or _IntervalLimiter
+    if rps >= 1:
+        return limiter_cls(rps, 1.0)
+    return limiter_cls(1, 1.0 / rps)
+
+
+async def upload_directory(
     directory: str,
     api_url: str,
     jwt_token: str,
     field: str = None,
     topic: str = None,
     delay: float = 1.0,
-    pattern: str = "*.pdf"
+    pattern: str = "*.pdf",
+    concurrency: int = 4,
+    rps: float = None,
+    force: bool = False,
+    user: str = None
 ):
     """
     Upload all PDFs from a directory.
 
+    The directory is scanned incrementally: matching files are fed through
+    a bounded queue to `concurrency` upload workers, so uploads start right
+    away and memory stays flat however many files there are. Uploads share
+    one HTTP/2 connection pool, and upload starts are rate limited to `rps`
+    per second by a token bucket.
+
+    Successful uploads are appended to .oshima_uploaded.jsonl in the
+    directory; PDFs whose content hash is already listed there for the same
+    API and user are skipped, so an interrupted run can simply be restarted.
+
     Args:
         directory: Path to directory containing PDFs
         api_url: Oshima API URL
         jwt_token: JWT access token
         field: Default research field for all papers
         topic: Default research topic for all papers
-        delay: Delay in seconds between uploads (to avoid rate limiting)
-        pattern: File pattern to match (default: *.pdf)
+        delay: Seconds between upload starts, used when `rps` is not given (0 = no limit)
+        pattern: Filename pattern to match (default: *.pdf)
+        concurrency: Maximum number of uploads in flight at once
+        rps: Maximum upload starts per second (overrides `delay`)
+        force: Upload every PDF, even those already in the manifest
+        user: Account the uploads are made as, recorded in the manifest
 
     Returns:
         Dictionary with upload statistics
@@ -168,67 +312,200 @@ def upload_directory(
     if not dir_path.is_dir():
         raise ValueError(f"Not a directory: {directory}")
 
-    # Find all PDFs
-    pdf_files = sorted(dir_path.glob(pattern))
+    if concurrency < 1:
+        raise ValueError(f"Concurrency must be at least 1, got {concurrency}")
 
-    if not pdf_files:
-        print(f"⚠️  No PDF files found in {directory}")
-        return {"total": 0, "success": 0, "failed": 0}
+    if rps is not None and not 0 < rps < math.inf:
+        raise ValueError(f"Rate must be a finite number greater than 0, got {rps}")
+
+    if not 0 <= delay < math.inf:
+        raise ValueError(f"Delay must be a finite number >= 0, got {delay}")
 
-    print(f"\n📁 Found {len(pdf_files)} PDF file(s) in {directory}")
+    if rps is None and delay > 0:
+        rps = 1.0 / delay
+    limiter = make_rate_limiter(rps) if rps else contextlib.nullcontext()
+
+    print(f"\n📁 Scanning {directory} for {pattern}")
+    print(f"   Uploading with concurrency {concurrency}" + (f", at most {rps:g} upload(s)/s" if rps else ""))
     print("=" * 80)
 
     results = {
-        "total": len(pdf_files),
+        "total": 0,
         "success": 0,
         "failed": 0,
+        "skipped": 0,
         "uploads": []
     }
 
-    for i, pdf_path in enumerate(pdf_files, 1):
-        print(f"\n[{i}/{len(pdf_files)}] 📤 Uploading: {pdf_path.name}")
-
-        # Use filename (without extension) as title if available
-        title = pdf_path.stem
-
-        result = upload_paper_with_jwt(
-            api_url=api_url,
-            jwt_token=jwt_token,
-            pdf_path=str(pdf_path),
-            title=title,
-            field=field,
-            topic=topic
-        )
-
-        if result:
-            print(f"   ✅ Success!")
-            print(f"      Paper ID: {result['data']['paper_id']}")
-            print(f"      Status: {result['data']['status']}")
-            results["success"] += 1
-            results["uploads"].append({
+    manifest_path = dir_path / MANIFEST_NAME
+    uploaded = {} if force else load_manifest(manifest_path, api_url, user)
+
+    # Bounded queue: the scan runs at most 2x concurrency files ahead of the uploads
+    queue = asyncio.Queue(maxsize=2 * concurrency)
+
+    async def produce(pool: Executor):
+        """Queue matching PDFs as the directory is scanned, hashing them ahead on the pool."""
+        loop = asyncio.get_running_loop()
+        try:
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    if entry.is_file() and fnmatch.fnmatch(entry.name, pattern):
+                        results["total"] += 1
+                        pdf_path = Path(entry.path)
+                        # Hashing is CPU-bound: run it on the pool so it overlaps with uploads
+                        sha1 = loop.run_in_executor(pool, sha1_file, entry.path)
+                        await queue.put((results["total"], pdf_path, sha1))
+        finally:
+            for _ in range(concurrency):
+                await queue.put(None)
+
+    # Hashes being uploaded right now, so same-content files in this run wait for the first one
+    in_flight = {}
+
+    async def upload_one(i: int, pdf_path: Path, sha1: str, client: httpx.AsyncClient) -> dict:
+        previous = uploaded.get(sha1)
+        while previous is None and sha1 in in_flight:
+            await in_flight[sha1]
+            previous = uploaded.get(sha1)
+
+        if previous:
+            print(f"\n[{i}] ⏭️  Skipping {pdf_path.name} (already uploaded as {previous.get('paper_id')})")
+            results["skipped"] += 1
+            return {
                 "filename": pdf_path.name,
-                "paper_id": result['data']['paper_id'],
-                "status": "success"
-            })
-        else:
-            print(f"   ❌ Failed")
+                "paper_id": previous.get("paper_id"),
+                "status": "skipped"
+            }
+
+        in_flight[sha1] = asyncio.get_running_loop().create_future()
+        try:
+            async with limiter:
+                print(f"\n[{i}] 📤 Uploading: {pdf_path.name}")
+
+                # Use filename (without extension) as title if available
+                title = pdf_path.stem
+
+                result = await upload_paper_with_jwt(
+                    client,
+                    api_url=api_url,
+                    jwt_token=jwt_token,
+                    pdf_path=str(pdf_path),
+                    title=title,
+                    field=field,
+                    topic=topic
+                )
+
+            if result:
+                print(f"   ✅ {pdf_path.name}")
+                print(f"      Paper ID: {result['data']['paper_id']}")
+                print(f"      Status: {result['data']['status']}")
+                results["success"] += 1
+                entry = {
+                    "filename": pdf_path.name,
+                    "sha1": sha1,
+                    "paper_id": result['data']['paper_id'],
+                    "api_url": api_url.rstrip("/"),
+                    "user": user,
+                    "ts": datetime.now(timezone.utc).isoformat()
+                }
+                uploaded[sha1] = entry
+                _record_upload(manifest_path, entry)
+                return {
+                    "filename": pdf_path.name,
+                    "paper_id": result['data']['paper_id'],
+                    "status": "success"
+                }
+
+            print(f"   ❌ Failed: {pdf_path.name}")
             results["failed"] += 1
-            results["uploads"].append({
+            return {
                 "filename": pdf_path.name,
                 "status": "failed"
-            })
-
-        # Delay between uploads to avoid rate limiting
-        if i < len(pdf_files):
-            print(f"   ⏳ Waiting {delay}s before next upload...")
-            time.sleep(delay)
+            }
+        finally:
+            in_flight.pop(sha1).set_result(None)
+
+    async def consume(client: httpx.AsyncClient):
+        """Upload queued PDFs until the producer signals the end of the scan."""
+        while (item := await queue.get()) is not None:
+            i, pdf_path, sha1 = item
+            try:
+                sha1 = await sha1
+            except OSError as e:
+                print(f"\n[{i}] ❌ Could not read {pdf_path.name}: {e}")
+                results["failed"] += 1
+                results["uploads"].append({"filename": pdf_path.name, "status": "failed"})
+                continue
+            results["uploads"].append(await upload_one(i, pdf_path, sha1, client))
+
+    with _hash_pool() as pool:
+        async with make_async_http_client(max_connections=concurrency) as client:
+            await asyncio.gather(produce(pool), *(consume(client) for _ in range(concurrency)))
+
+    if not results["total"]:
+        print(f"⚠️  No PDF files found in {directory}")
 
     return results
 
 
+def _positive_int(value: str) -> int:
+    """argparse type for integers >= 1."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"must be an integer, got {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
+def _positive_float(value: str) -> float:
+    """argparse type for numbers > 0."""
+    try:
+        number = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"must be a number, got {value!r}")
+    if not 0 < number < math.inf:
+        raise argparse.ArgumentTypeError(f"must be a finite number greater than 0, got {value}")
+    return number
+
+
+def _non_negative_float(value: str) -> float:
+    """argparse type for numbers >= 0."""
+    try:
+        number = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"must be a number, got {value!r}")
+    if not 0 <= number < math.inf:
+        raise argparse.ArgumentTypeError(f"must be a finite number >= 0, got {value}")
+    return number
+
+
+def parse_args(argv: list = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Upload all PDFs from a directory to the Oshima API.",
+        epilog="Example: python upload_directory.py ./papers --field 'Computer Science' --topic 'AI'"
+    )
+    parser.add_argument('directory', help="Path to directory containing PDFs")
+    parser.add_argument('--field', help="Research field for all papers")
+    parser.add_argument('--topic', help="Research topic for all papers")
+    parser.add_argument('--delay', type=_non_negative_float, default=1.0,
+                        help="Seconds between upload starts, 0 for no limit (default: 1.0)")
+    parser.add_argument('--rps', type=_positive_float,
+                        help="Max upload starts per second (overrides --delay)")
+    parser.add_argument('--pattern', default="*.pdf", help="File pattern (default: *.pdf)")
+    parser.add_argument('--concurrency', type=_positive_int, default=4, help="Parallel uploads (default: 4)")
+    parser.add_argument('--force', action='store_true',
+                        help=f"Re-upload PDFs already recorded in {MANIFEST_NAME}")
+    return parser.parse_args(argv)
+
+
 def main():
     """Main entry point"""
 
+    args = parse_args()
+
     # Load environment variables
     load_dotenv()
 
@@ -257,61 +534,30 @@ def main():
         print("\nSet these in your .env file")
         sys.exit(1)
 
-    # Get directory path from command line
-    if len(sys.argv) < 2:
-        print("Usage: python upload_directory.py <directory-path> [options]")
-        print("\nRequired:")
-        print("  <directory-path>    Path to directory containing PDFs")
-        print("\nOptional:")
-        print("  --field 'Research Field'")
-        print("  --topic 'Topic'")
-        print("  --delay <seconds>      Delay between uploads (default: 1.0)")
-        print("  --pattern '*.pdf'      File pattern (default: *.pdf)")
-        print("\nExample:")
-        print("  python upload_directory.py ./papers --field 'Computer Science' --topic 'AI'")
-        sys.exit(1)
-
-    directory = sys.argv[1]
-
-    # Parse optional arguments
-    field = None
-    topic = None
-    delay = 1.0
-    pattern = "*.pdf"
-
-    i = 2
-    while i < len(sys.argv):
-        arg = sys.argv[i]
-        if arg == '--field' and i + 1 < len(sys.argv):
-            field = sys.argv[i + 1]
-            i += 2
-        elif arg == '--topic' and i + 1 < len(sys.argv):
-            topic = sys.argv[i + 1]
-            i += 2
-        elif arg == '--delay' and i + 1 < len(sys.argv):
-            delay = float(sys.argv[i + 1])
-            i += 2
-        elif arg == '--pattern' and i + 1 < len(sys.argv):
-            pattern = sys.argv[i + 1]
-            i += 2
-        else:
-            print(f"⚠️  Unknown argument: {arg}")
-            i += 1
-
     try:
         # Step 1: Authenticate and get JWT
-        jwt_token = get_jwt_token(supabase_url, supabase_anon_key, email, password)
+        with make_http_client() as client:
+            # A directory upload can run for a long time: only reuse a token
+            # that is nearly fresh, otherwise refresh it first
+            jwt_token = get_cached_jwt(
+                client, supabase_url, supabase_anon_key, email, password,
+                min_validity=UPLOAD_TOKEN_MIN_VALIDITY
+            )
 
         # Step 2: Upload all PDFs from directory
-        results = upload_directory(
-            directory=directory,
+        results = asyncio.run(upload_directory(
+            directory=args.directory,
             api_url=api_url,
             jwt_token=jwt_token,
-            field=field,
-            topic=topic,
-            delay=delay,
-            pattern=pattern
-        )
+            field=args.field,
+            topic=args.topic,
+            delay=args.delay,
+            pattern=args.pattern,
+            concurrency=args.concurrency,
+            rps=args.rps,
+            force=args.force,
+            user=email
+        ))
 
         # Step 3: Print summary
         print("\n" + "=" * 80)
@@ -319,6 +565,7 @@ def main():
         print("=" * 80)
         print(f"Total files: {results['total']}")
         print(f"Successful: {results['success']} ✅")
+        print(f"Skipped (already uploaded): {results['skipped']} ⏭️")
         print(f"Failed: {results['failed']} ❌")
         print("=" * 80)
 
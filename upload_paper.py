@@ -6,61 +6,22 @@ This uses JWT authentication (no service role key needed).
 Based on: api/docs/temporary/frontend_endpoints_authentication_overview.md
 
 Requirements:
-    pip install httpx python-dotenv
+    pip install "httpx[http2]" python-dotenv
 """
 
 import httpx
 import sys
 import os
+import argparse
+import json
 from pathlib import Path
 from dotenv import load_dotenv
 
-
-def get_jwt_token(supabase_url: str, supabase_anon_key: str, email: str, password: str) -> str:
-    """
-    Sign in to Supabase and get a JWT token.
-
-    Args:
-        supabase_url: Supabase project URL
-        supabase_anon_key: Supabase anon/public key
-        email: User email
-        password: User password
-
-    Returns:
-        JWT access token
-    """
-    url = f"{supabase_url}/auth/v1/token?grant_type=password"
-
-    headers = {
-        "apikey": supabase_anon_key,
-        "Content-Type": "application/json"
-    }
-
-    data = {
-        "email": email,
-        "password": password
-    }
-
-    print(f"🔑 Authenticating as {email}...")
-
-    response = httpx.post(url, json=data, headers=headers, timeout=30.0)
-
-    if response.status_code != 200:
-        print(f"❌ Authentication failed: {response.status_code}")
-        print(f"Response: {response.text}")
-        response.raise_for_status()
-
-    result = response.json()
-    access_token = result.get("access_token")
-
-    if not access_token:
-        raise ValueError("No access token in response")
-
-    print(f"✅ Authenticated successfully")
-    return access_token
+from oshima_auth import UPLOAD_RETRY_ERRORS, UPLOAD_RETRY_STATUSES, get_cached_jwt, make_http_client, post_with_retry
 
 
 def upload_paper_with_jwt(
+    client: httpx.Client,
     api_url: str,
     jwt_token: str,
     pdf_path: str,
@@ -73,6 +34,7 @@ def upload_paper_with_jwt(
     Upload a paper PDF using the POST /papers/ endpoint with JWT auth.
 
     Args:
+        client: Shared HTTP client
         api_url: Oshima API URL
         jwt_token: JWT access token from Supabase auth
         pdf_path: Path to PDF file
@@ -121,8 +83,11 @@ def upload_paper_with_jwt(
         if topic:
             print(f"   Topic: {topic}")
 
-        response = httpx.post(
+        response = post_with_retry(
+            client,
             url,
+            retry_on=UPLOAD_RETRY_STATUSES,
+            retry_errors=UPLOAD_RETRY_ERRORS,
             files=files,
             data=data,
             headers=headers,
@@ -148,9 +113,26 @@ def upload_paper_with_jwt(
     return result
 
 
+def parse_args(argv: list = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Upload a single PDF to the Oshima API.",
+        epilog="Configuration is read from .env: OSHIMA_API_URL, SUPABASE_URL, "
+               "SUPABASE_ANON_KEY, OSHIMA_EMAIL, OSHIMA_PASSWORD"
+    )
+    parser.add_argument('pdf_path', help="Path to PDF file")
+    parser.add_argument('--title', help="Paper title")
+    parser.add_argument('--field', help="Research field")
+    parser.add_argument('--topic', help="Research topic")
+    parser.add_argument('--doi', help="DOI identifier, e.g. 10.1234/example")
+    return parser.parse_args(argv)
+
+
 def main():
     """Main entry point"""
 
+    args = parse_args()
+
     # Load environment variables
     load_dotenv()
 
@@ -184,63 +166,24 @@ def main():
         print("  OSHIMA_PASSWORD=your-password")
         sys.exit(1)
 
-    # Get PDF path from command line
-    if len(sys.argv) < 2:
-        print("Usage: python upload_paper.py <path-to-pdf> [options]")
-        print("\nRequired:")
-        print("  <path-to-pdf>    Path to PDF file")
-        print("\nOptional (via command line or edit script):")
-        print("  --title 'Paper Title'")
-        print("  --field 'Research Field'")
-        print("  --topic 'Topic'")
-        print("  --doi '10.1234/example'")
-        print("\nConfiguration:")
-        print("  Set in .env file:")
-        print("    OSHIMA_API_URL")
-        print("    SUPABASE_URL")
-        print("    SUPABASE_ANON_KEY")
-        print("    OSHIMA_EMAIL")
-        print("    OSHIMA_PASSWORD")
-        sys.exit(1)
-
-    pdf_path = sys.argv[1]
-
-    # Parse optional arguments (simple implementation)
-    title = None
-    field = None
-    topic = None
-    doi = None
-
-    for i in range(2, len(sys.argv), 2):
-        if i + 1 < len(sys.argv):
-            arg = sys.argv[i]
-            value = sys.argv[i + 1]
-            if arg == '--title':
-                title = value
-            elif arg == '--field':
-                field = value
-            elif arg == '--topic':
-                topic = value
-            elif arg == '--doi':
-                doi = value
-
     try:
-        # Step 1: Authenticate and get JWT
-        jwt_token = get_jwt_token(supabase_url, supabase_anon_key, email, password)
-
-        # Step 2: Upload paper
-        result = upload_paper_with_jwt(
-            api_url=api_url,
-            jwt_token=jwt_token,
-            pdf_path=pdf_path,
-            title=title,
-            doi=doi,
-            field=field,
-            topic=topic
-        )
+        with make_http_client() as client:
+            # Step 1: Authenticate and get JWT
+            jwt_token = get_cached_jwt(client, supabase_url, supabase_anon_key, email, password)
+
+            # Step 2: Upload paper
+            result = upload_paper_with_jwt(
+                client,
+                api_url=api_url,
+                jwt_token=jwt_token,
+                pdf_path=args.pdf_path,
+                title=args.title,
+                doi=args.doi,
+                field=args.field,
+                topic=args.topic
+            )
 
         print(f"\n📊 Full response:")
-        import json
         print(json.dumps(result, indent=2))
 
     except FileNotFoundError as e: